@@ -1,18 +1,32 @@
 import praw
-from flask import Flask, jsonify, request, abort
+from flask import Flask, g, jsonify, request, abort
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import sqlite3
 from sqlite3 import Error
 import logging
+import queue
+import re
+import threading
 import time
 from datetime import datetime
 import os
 import secrets
 import hashlib
+import hmac
+from functools import lru_cache
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 # Import for sentiment analysis
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 
+# orjson is optional; without it Flask's stdlib JSON provider is used
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -24,7 +38,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider that serializes with orjson, deferring to Flask's encoder for other types."""
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+if orjson is not None:
+    app.json = ORJSONProvider(app)
 CORS(app, supports_credentials=True)  # Enable CORS with credentials support
 
 # Configuration
@@ -37,10 +61,84 @@ cache = {
     'timestamp': {}
 }
 CACHE_TIMEOUT = 300  # 5 minutes cache timeout
+CACHE_MAX_ENTRIES = 256  # Keys include user-supplied query strings, so bound the number kept
+cache_lock = threading.Lock()
+SEARCH_CACHE_TIMEOUT = 60  # Live search results go stale quickly
+SEARCH_TIMEOUT = 10  # Seconds to wait on Reddit before giving up
+
+# Worker pool for the blocking PRAW calls made by live search and comment fetches
+search_executor = ThreadPoolExecutor(max_workers=16)
+
+# Background writes are batched into one transaction per flush
+WRITE_BATCH_SIZE = 100
+WRITE_FLUSH_INTERVAL = 0.05  # seconds
+
+# Pending (sql, rows) writes drained by db_writer
+write_queue = queue.Queue()
+
+# Queued statements are module constants so the writer's sqlite3 statement cache reuses one prepared form
+# Upserting updates a refetched comment in place instead of deleting and reinserting its row
+INSERT_COMMENT_SQL = '''
+    INSERT INTO comments(
+        id, post_id, author, body, score, created_utc,
+        sentiment_neg, sentiment_neu, sentiment_pos, sentiment_compound
+    )
+    VALUES(?,?,?,?,?,?,?,?,?,?)
+    ON CONFLICT(id) DO UPDATE SET
+        author = excluded.author,
+        body = excluded.body,
+        score = excluded.score,
+        sentiment_neg = excluded.sentiment_neg,
+        sentiment_neu = excluded.sentiment_neu,
+        sentiment_pos = excluded.sentiment_pos,
+        sentiment_compound = excluded.sentiment_compound
+'''
+
+# Idle connections reused across requests; LIFO keeps the warmest page caches in use
+DB_POOL_SIZE = 8
+db_pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+read_db_pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+
+# scrypt cost for password hashes (~16 MiB of memory per hash)
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+# Optional server-side pepper mixed in with HMAC-SHA256 before scrypt; unset means no pepper
+PASSWORD_PEPPER = os.environ.get('PASSWORD_PEPPER', '').encode()
+PASSWORD_SCHEME = 'scrypt-hmac' if PASSWORD_PEPPER else 'scrypt'
+
+# VADER rounds compound scores to 4 decimal places, so this scale stores them as exact integers
+SENTIMENT_SCALE = 10000
+SENTIMENT_Q_EXPR = f"CAST(ROUND(sentiment_compound * {SENTIMENT_SCALE}) AS INTEGER)"
+SENTIMENT_THRESHOLD = 0.05  # compound scores within +/- this are neutral
+
+# Short bodies repeat a lot ("lol", "This.", "Thanks!"), so their scores are memoized
+SENTIMENT_MEMO_SIZE = 4096
+SENTIMENT_MEMO_MAX_LEN = 280  # longer texts rarely repeat and would bloat the memo
+
+# Columns /posts may be sorted by; sort_by is interpolated into ORDER BY so it must come from here
+SORTABLE_COLUMNS = frozenset([
+    'id', 'title', 'score', 'num_comments', 'upvote_ratio', 'url', 'author',
+    'created_utc', 'sentiment_compound'
+])
+
+# Live search sorts served from a subreddit listing rather than Reddit search; results are filtered locally
+LISTING_SORTS = {
+    'hot': lambda sr, limit, time_filter: sr.hot(limit=limit),
+    'new': lambda sr, limit, time_filter: sr.new(limit=limit),
+    'top': lambda sr, limit, time_filter: sr.top(limit=limit, time_filter=time_filter),
+}
 
 # Initialize VADER sentiment analyzer
 analyzer = SentimentIntensityAnalyzer()
 
+# Empty text and Reddit's placeholder bodies are scored once at startup and returned without calling VADER
+TRIVIAL_SENTIMENT = {
+    text: analyzer.polarity_scores(text)
+    for text in ("", "[deleted]", "[removed]", "[ Removed by Reddit ]")
+}
+
 # Initialize PRAW for Reddit API
 try:
     # Get credentials from environment variables or use fallback values
@@ -55,16 +153,118 @@ except Exception as e:
     # Create a placeholder that will handle errors gracefully
     reddit = None
 
-def get_db_connection():
-    """Establish a connection to the SQLite database."""
+def get_db_connection(readonly=False):
+    """Establish a connection to the SQLite database, opened with mode=ro when readonly."""
     try:
-        conn = sqlite3.connect(DATABASE)
+        # Autocommit: statements commit on their own unless wrapped in an explicit BEGIN
+        # timeout is SQLite's busy timeout, so writers wait on the lock instead of failing
+        # check_same_thread=False because pooled connections serve whichever thread takes them next
+        # mode=ro connections can never take the write lock, so GET traffic can't stall the writer
+        database = f"file:{DATABASE}?mode=ro" if readonly else f"file:{DATABASE}"
+        conn = sqlite3.connect(database, timeout=5.0, isolation_level=None, check_same_thread=False, uri=True)
         conn.row_factory = sqlite3.Row  # enables dict-like access for rows
+        conn.execute('PRAGMA cache_size = -65536')  # 64 MiB page cache
+        # WAL (set in init_db) stays consistent with NORMAL sync; only a power loss can drop the last commits
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute('PRAGMA mmap_size = 268435456')  # 256 MiB
+        # Enforce comments.post_id -> posts.id; the writer defers the check to COMMIT
+        conn.execute('PRAGMA foreign_keys = ON')
+        # Every query has a real index, so never build throwaway ones while planning
+        conn.execute('PRAGMA automatic_index = OFF')
         return conn
     except Error as e:
         logger.error(f"Database connection error: {e}")
         return None
 
+def get_db():
+    """Return the current request's read-write database connection, taken from the pool on first use."""
+    if 'db' not in g:
+        try:
+            g.db = db_pool.get_nowait()
+        except queue.Empty:
+            g.db = get_db_connection()
+    return g.db
+
+def get_read_db():
+    """Return the current request's read-only database connection, taken from the pool on first use."""
+    if 'read_db' not in g:
+        try:
+            g.read_db = read_db_pool.get_nowait()
+        except queue.Empty:
+            g.read_db = get_db_connection(readonly=True)
+    return g.read_db
+
+def release_db(conn, pool, optimize):
+    """Return a connection to its pool, closing it (after PRAGMA optimize if asked) when the pool is full."""
+    if conn is None:
+        return
+    if conn.in_transaction:
+        conn.execute('ROLLBACK')
+    try:
+        pool.put_nowait(conn)
+    except queue.Full:
+        if optimize:
+            try:
+                conn.execute('PRAGMA optimize')
+            except Error as e:
+                logger.warning(f"Skipping PRAGMA optimize on close: {e}")
+        conn.close()
+
+@app.teardown_appcontext
+def close_db(exception):
+    """Return the request's database connections to their pools."""
+    release_db(g.pop('db', None), db_pool, optimize=True)
+    # PRAGMA optimize may need to write statistics, which a mode=ro connection can't do
+    release_db(g.pop('read_db', None), read_db_pool, optimize=False)
+
+def post_columns():
+    """Stored posts columns as a select list; PRAGMA table_info omits generated ones like sentiment_q."""
+    conn = get_db_connection(readonly=True)
+    if conn is None:
+        return '*'
+    try:
+        return ', '.join(row['name'] for row in conn.execute('PRAGMA table_info(posts)')) or '*'
+    finally:
+        conn.close()
+
+def rows_as_dicts(cur):
+    """Build result dicts from a tuple-row cursor, reading the column names once per query."""
+    columns = [column[0] for column in cur.description]
+    return [dict(zip(columns, row)) for row in cur]
+
+def rollup_apply_sql(ref, sign, source='', match='1'):
+    """SQL that adds (sign=1) or subtracts (sign=-1) row ref's contribution to its posts_rollup bucket.
+
+    ref is a trigger's NEW/OLD row, or an alias selected by source (a FROM clause) where match holds.
+    Subtracting also removes the bucket once it is empty, so readers never see zero-count rows.
+    """
+    day = f"CAST({ref}.created_utc / 86400 AS INTEGER)"
+    op = '' if sign > 0 else '-'
+    sql = f'''
+        INSERT INTO posts_rollup (day, subreddit, pos, neu, neg, sum_score, sum_comments, cnt)
+        SELECT {day}, {ref}.subreddit,
+               {op}IFNULL({ref}.sentiment_compound > {SENTIMENT_THRESHOLD}, 0),
+               {op}IFNULL({ref}.sentiment_compound BETWEEN -{SENTIMENT_THRESHOLD} AND {SENTIMENT_THRESHOLD}, 0),
+               {op}IFNULL({ref}.sentiment_compound < -{SENTIMENT_THRESHOLD}, 0),
+               {op}IFNULL({ref}.score, 0), {op}IFNULL({ref}.num_comments, 0), {op}1
+        {source}
+        WHERE {match} AND {ref}.subreddit IS NOT NULL AND {ref}.created_utc IS NOT NULL
+        ON CONFLICT (day, subreddit) DO UPDATE SET
+            pos = pos + excluded.pos,
+            neu = neu + excluded.neu,
+            neg = neg + excluded.neg,
+            sum_score = sum_score + excluded.sum_score,
+            sum_comments = sum_comments + excluded.sum_comments,
+            cnt = cnt + excluded.cnt;
+    '''
+    if sign < 0:
+        sql += f'''
+        DELETE FROM posts_rollup
+        WHERE cnt <= 0 AND (day, subreddit) IN (SELECT {day}, {ref}.subreddit {source} WHERE {match});
+        '''
+    return sql
+
 def init_db():
     """Initialize database with tables and indexes for better performance."""
     conn = get_db_connection()
@@ -72,8 +272,11 @@ def init_db():
         try:
             cur = conn.cursor()
             
+            # WAL is stored in the database file, so setting it once lets readers and the writer overlap
+            cur.execute('PRAGMA journal_mode = WAL')
+            
             # Create posts table if it doesn't exist
-            cur.execute('''
+            cur.execute(f'''
                 CREATE TABLE IF NOT EXISTS posts (
                     id TEXT PRIMARY KEY,
                     title TEXT,
@@ -89,10 +292,27 @@ def init_db():
                     sentiment_pos REAL,
                     sentiment_compound REAL,
                     subreddit TEXT,
-                    collected_at REAL
+                    collected_at REAL DEFAULT (strftime('%s', 'now')),
+                    sentiment_q INTEGER GENERATED ALWAYS AS ({SENTIMENT_Q_EXPR}) VIRTUAL
                 )
             ''')
             
+            # sentiment_q is sentiment_compound scaled to an integer; filters compare against it.
+            # As a virtual generated column it costs no stored bytes and needs no triggers.
+            # Older databases kept it as a trigger-maintained stored column; convert them once.
+            cur.execute('BEGIN IMMEDIATE')
+            hidden = {row['name']: row['hidden'] for row in cur.execute('PRAGMA table_xinfo(posts)')}
+            if hidden.get('sentiment_q') != 2:
+                cur.execute('DROP TRIGGER IF EXISTS trg_posts_sentiment_q_insert')
+                cur.execute('DROP TRIGGER IF EXISTS trg_posts_sentiment_q_update')
+                if 'sentiment_q' in hidden:
+                    cur.execute('DROP INDEX IF EXISTS idx_sentq_time')
+                    cur.execute('ALTER TABLE posts DROP COLUMN sentiment_q')
+                cur.execute(f'''
+                    ALTER TABLE posts ADD COLUMN sentiment_q INTEGER GENERATED ALWAYS AS ({SENTIMENT_Q_EXPR}) VIRTUAL
+                ''')
+            cur.execute('COMMIT')
+            
             # Create comments table if it doesn't exist
             cur.execute('''
                 CREATE TABLE IF NOT EXISTS comments (
@@ -120,13 +340,127 @@ def init_db():
             ''')
             
             # Create indexes for better query performance
-            cur.execute('CREATE INDEX IF NOT EXISTS idx_score ON posts (score)')
-            cur.execute('CREATE INDEX IF NOT EXISTS idx_num_comments ON posts (num_comments)')
-            cur.execute('CREATE INDEX IF NOT EXISTS idx_created_utc ON posts (created_utc)')
-            cur.execute('CREATE INDEX IF NOT EXISTS idx_sentiment_compound ON posts (sentiment_compound)')
-            cur.execute('CREATE INDEX IF NOT EXISTS idx_subreddit ON posts (subreddit)')
+            # Composite indexes matching the common filter + ORDER BY pairs in /posts.
+            # Newest-first scans read sentiment_q from idx_time_sentq, which also covers plain time ordering.
+            cur.execute('CREATE INDEX IF NOT EXISTS idx_time_sentq ON posts (created_utc DESC, sentiment_q)')
+            cur.execute('CREATE INDEX IF NOT EXISTS idx_score_time ON posts (score DESC, created_utc DESC)')
+            cur.execute('CREATE INDEX IF NOT EXISTS idx_comments_time ON posts (num_comments DESC, created_utc DESC)')
+            cur.execute('CREATE INDEX IF NOT EXISTS idx_sentiment_time ON posts (sentiment_compound DESC, created_utc DESC)')
+            # Comments are always read for one post, highest score first
+            cur.execute('CREATE INDEX IF NOT EXISTS idx_comments_post_score ON comments (post_id, score DESC)')
+            # Leading columns of the composites above make these single-column indexes redundant
+            cur.execute('DROP INDEX IF EXISTS idx_score')
+            cur.execute('DROP INDEX IF EXISTS idx_num_comments')
+            cur.execute('DROP INDEX IF EXISTS idx_sentiment_compound')
+            cur.execute('DROP INDEX IF EXISTS idx_created_utc')
+            # The only subreddit predicate is a substring LIKE, which no index can serve, and the
+            # rollup triggers no longer scan posts, so subreddit indexes are pure write cost
+            cur.execute('DROP INDEX IF EXISTS idx_subreddit')
+            cur.execute('DROP INDEX IF EXISTS idx_posts_sub_created')
+            # Superseded by idx_time_sentq and idx_sentiment_time, whose column order the queries can use
+            cur.execute('DROP INDEX IF EXISTS idx_sentq_time')
+            cur.execute('DROP INDEX IF EXISTS idx_sent_time')
+            
+            # Per-day, per-subreddit aggregates so summary endpoints don't scan posts
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS posts_rollup (
+                    day INTEGER NOT NULL,
+                    subreddit TEXT NOT NULL,
+                    pos INTEGER NOT NULL,
+                    neu INTEGER NOT NULL,
+                    neg INTEGER NOT NULL,
+                    sum_score INTEGER,
+                    sum_comments INTEGER,
+                    cnt INTEGER NOT NULL,
+                    PRIMARY KEY (day, subreddit)
+                )
+            ''')
+            # Row a pending insert may replace. INSERT OR REPLACE only fires the delete trigger under
+            # PRAGMA recursive_triggers, so the insert trigger subtracts the replaced row itself.
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS posts_rollup_replaced (
+                    id TEXT PRIMARY KEY,
+                    subreddit TEXT,
+                    created_utc REAL,
+                    score INTEGER,
+                    num_comments INTEGER,
+                    sentiment_compound REAL
+                )
+            ''')
+            # One transaction so concurrent workers never see the triggers half-migrated
+            cur.execute('BEGIN IMMEDIATE')
+            # Earlier versions recounted the whole bucket on every write
+            for legacy in ('trg_posts_rollup_insert', 'trg_posts_rollup_delete', 'trg_posts_rollup_update'):
+                cur.execute(f'DROP TRIGGER IF EXISTS {legacy}')
+            # Buckets are adjusted by each row's contribution. The BEFORE INSERT stash fires even for
+            # INSERT OR IGNORE and upserts whose row already exists, where the AFTER INSERT trigger never
+            # runs; the update trigger and the next completed insert clear those stale stash rows.
+            cur.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_posts_rollup_stash BEFORE INSERT ON posts
+                BEGIN
+                    DELETE FROM posts_rollup_replaced WHERE id = NEW.id;
+                    INSERT INTO posts_rollup_replaced
+                    SELECT id, subreddit, created_utc, score, num_comments, sentiment_compound
+                    FROM posts WHERE id = NEW.id;
+                END
+            ''')
+            replaced = "FROM posts_rollup_replaced AS r"
+            cur.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_posts_rollup_add AFTER INSERT ON posts
+                BEGIN
+                    {rollup_apply_sql('r', -1, source=replaced, match='r.id = NEW.id')}
+                    -- Rows are inserted one at a time, so anything else stashed was from an ignored insert
+                    DELETE FROM posts_rollup_replaced;
+                    {rollup_apply_sql('NEW', 1)}
+                END
+            ''')
+            cur.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_posts_rollup_remove AFTER DELETE ON posts
+                BEGIN
+                    {rollup_apply_sql('OLD', -1)}
+                    DELETE FROM posts_rollup_replaced WHERE id = OLD.id;
+                END
+            ''')
+            cur.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_posts_rollup_change
+                AFTER UPDATE OF subreddit, created_utc, score, num_comments, sentiment_compound ON posts
+                BEGIN
+                    {rollup_apply_sql('OLD', -1)}
+                    {rollup_apply_sql('NEW', 1)}
+                END
+            ''')
+            # Upserts take the DO UPDATE path instead of AFTER INSERT, so drop their stashed copy here
+            cur.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_posts_rollup_unstash AFTER UPDATE ON posts
+                BEGIN
+                    DELETE FROM posts_rollup_replaced WHERE id = NEW.id;
+                END
+            ''')
+            # Buckets built by the old recount could hold NULL sums, which would absorb every delta
+            cur.execute('UPDATE posts_rollup SET sum_score = IFNULL(sum_score, 0), sum_comments = IFNULL(sum_comments, 0) '
+                        'WHERE sum_score IS NULL OR sum_comments IS NULL')
+            # One-time backfill for posts written before the rollup existed
+            if cur.execute('SELECT 1 FROM posts_rollup LIMIT 1').fetchone() is None:
+                cur.execute(f'''
+                    INSERT INTO posts_rollup (day, subreddit, pos, neu, neg, sum_score, sum_comments, cnt)
+                    SELECT CAST(created_utc / 86400 AS INTEGER) AS day, subreddit,
+                           TOTAL(sentiment_compound > {SENTIMENT_THRESHOLD}),
+                           TOTAL(sentiment_compound BETWEEN -{SENTIMENT_THRESHOLD} AND {SENTIMENT_THRESHOLD}),
+                           TOTAL(sentiment_compound < -{SENTIMENT_THRESHOLD}),
+                           TOTAL(score), TOTAL(num_comments), COUNT(*)
+                    FROM posts
+                    WHERE subreddit IS NOT NULL AND created_utc IS NOT NULL
+                    GROUP BY day, subreddit
+                ''')
+            cur.execute('COMMIT')
+            
+            if not PASSWORD_PEPPER and cur.execute(
+                    "SELECT 1 FROM users WHERE password_hash LIKE 'scrypt-hmac$%' LIMIT 1").fetchone():
+                logger.error("PASSWORD_PEPPER is not set but peppered password hashes exist; those users cannot log in")
+            
+            # Refresh planner statistics so the composite indexes get picked
+            cur.execute('ANALYZE')
             
-            conn.commit()
             logger.info("Database tables and indexes created successfully")
         except Error as e:
             logger.error(f"Error creating database: {e}")
@@ -138,12 +472,122 @@ with app.app_context():
     init_db()
     logger.info("Database initialized")
 
+# The schema only changes in init_db, so /posts reuses one column list instead of SELECT *
+POST_COLUMNS = post_columns()
+
+def enqueue_writes(sql, rows):
+    """Queue rows for one statement for the background writer instead of committing on the request thread."""
+    write_queue.put((sql, rows))
+
+def rollback_quietly(conn):
+    """Roll back conn's open transaction, logging instead of raising so the writer thread survives."""
+    try:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+    except Exception as e:
+        logger.error(f"Error rolling back queued writes: {e}")
+
+def write_statements(conn, statements):
+    """Run each statement's rows with executemany in one transaction, rolling back and re-raising on failure."""
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        # Check foreign keys once at COMMIT rather than per row; resets after each transaction
+        conn.execute('PRAGMA defer_foreign_keys = ON')
+        for sql, rows in statements.items():
+            conn.executemany(sql, rows)
+        conn.execute('COMMIT')
+    except Exception:
+        rollback_quietly(conn)
+        raise
+
+def write_rows_individually(conn, batch):
+    """Retry a failed flush row by row in one transaction, skipping rows that fail instead of the whole batch.
+
+    Foreign keys are checked immediately here, and each row runs in its own savepoint so a failing
+    row is rolled back explicitly rather than relying on SQLite's statement-level abort.
+    """
+    written = 0
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        for sql, rows in batch:
+            for row in rows:
+                conn.execute('SAVEPOINT queued_row')
+                try:
+                    conn.execute(sql, row)
+                    written += 1
+                except Exception as e:
+                    conn.execute('ROLLBACK TO queued_row')
+                    logger.error(f"Dropping queued row {row[:1]} that failed to write: {e}")
+                conn.execute('RELEASE queued_row')
+        conn.execute('COMMIT')
+    except Exception as e:
+        rollback_quietly(conn)
+        logger.error(f"Error retrying {len(batch)} queued writes individually: {e}")
+        return 0
+    return written
+
+def db_writer():
+    """Drain write_queue, running each flush's statements with executemany in one transaction."""
+    conn = None
+    while True:
+        batch = [write_queue.get()]
+        deadline = time.time() + WRITE_FLUSH_INTERVAL
+        while len(batch) < WRITE_BATCH_SIZE:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(write_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        if conn is None:
+            conn = get_db_connection()
+            if conn is None:
+                logger.error(f"Dropping {len(batch)} queued writes: no database connection")
+                continue
+
+        # Group rows by statement, keeping first-seen order, so each statement runs once per flush
+        statements = {}
+        for sql, rows in batch:
+            statements.setdefault(sql, []).extend(rows)
+        try:
+            write_statements(conn, statements)
+        except Exception as e:
+            # Retry row by row so one bad row can't discard other requests' writes
+            logger.error(f"Error writing batch of {len(batch)} queued writes, retrying individually: {e}")
+            write_rows_individually(conn, batch)
+
+        # A connection that couldn't roll back is unusable; open a fresh one for the next flush
+        if conn.in_transaction:
+            logger.error("Writer connection stuck in a transaction; reopening it")
+            conn.close()
+            conn = None
+
+# Single writer thread so request handlers never wait on SQLite commits
+writer_thread = threading.Thread(target=db_writer, name='db-writer', daemon=True)
+writer_thread.start()
+
+@lru_cache(maxsize=SENTIMENT_MEMO_SIZE)
+def score_short_text(text):
+    """Memoized VADER scores for a short text; the returned dict is shared, so treat it as read-only."""
+    return analyzer.polarity_scores(text)
+
+def score_text(text):
+    """VADER scores for text, served from the memo when it is short enough to be worth caching."""
+    # VADER splits on whitespace, so stripping leaves scores unchanged and lets the shortcuts match
+    text = (text or "").strip()
+    trivial = TRIVIAL_SENTIMENT.get(text)
+    if trivial is not None:
+        return trivial
+    if len(text) <= SENTIMENT_MEMO_MAX_LEN:
+        return score_short_text(text)
+    return analyzer.polarity_scores(text)
+
 def analyze_sentiment(text):
     """Analyze sentiment of text using VADER."""
     try:
-        if not text:
-            return analyzer.polarity_scores("")
-        return analyzer.polarity_scores(text)
+        return score_text(text)
     except Exception as e:
         logger.error(f"Error analyzing sentiment: {e}")
         # Return neutral sentiment in case of error
@@ -151,19 +595,59 @@ def analyze_sentiment(text):
 
 # Cache helper function - not using decorator
 def check_cache(cache_key, timeout=CACHE_TIMEOUT):
-    """Check if response is in cache."""
-    if cache_key in cache['data'] and time.time() - cache['timestamp'][cache_key] < timeout:
-        logger.info(f"Cache hit for {cache_key}")
-        return cache['data'][cache_key]
-    return None
+    """Check if response is in cache, dropping it once expired."""
+    with cache_lock:
+        if cache_key not in cache['data']:
+            return None
+        if time.time() - cache['timestamp'][cache_key] >= timeout:
+            del cache['data'][cache_key], cache['timestamp'][cache_key]
+            return None
+        # Re-insert so cache['data'] stays in least-recently-used order
+        response = cache['data'][cache_key] = cache['data'].pop(cache_key)
+    logger.info(f"Cache hit for {cache_key}")
+    return response
 
 def set_cache(cache_key, response):
-    """Set response in cache."""
-    cache['data'][cache_key] = response
-    cache['timestamp'][cache_key] = time.time()
+    """Set response in cache, evicting the least recently used entries beyond CACHE_MAX_ENTRIES."""
+    with cache_lock:
+        cache['data'].pop(cache_key, None)
+        cache['data'][cache_key] = response
+        cache['timestamp'][cache_key] = time.time()
+        while len(cache['data']) > CACHE_MAX_ENTRIES:
+            oldest = next(iter(cache['data']))
+            del cache['data'][oldest], cache['timestamp'][oldest]
     logger.info(f"Cached response for {cache_key}")
     return response
 
+def password_input(password, scheme):
+    """Bytes fed to scrypt for a scheme; 'scrypt-hmac' first applies the pepper with HMAC-SHA256."""
+    if scheme == 'scrypt-hmac':
+        if not PASSWORD_PEPPER:
+            # An empty HMAC key would silently fail every peppered login instead
+            raise ValueError("PASSWORD_PEPPER is not set, so scrypt-hmac hashes cannot be verified")
+        return hmac.new(PASSWORD_PEPPER, password.encode(), hashlib.sha256).digest()
+    return password.encode()
+
+def hash_password(password):
+    """Hash a password with a random salt, returning 'scheme$n$r$p$salt$hash' for storage."""
+    salt = secrets.token_bytes(16)
+    digest = hashlib.scrypt(password_input(password, PASSWORD_SCHEME), salt=salt,
+                            n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+    return f"{PASSWORD_SCHEME}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+def verify_password(stored_hash, password):
+    """Check a password against a stored hash, including legacy unsalted SHA-256 hashes."""
+    scheme = stored_hash.split('$', 1)[0]
+    if scheme in ('scrypt', 'scrypt-hmac'):
+        _, n, r, p, salt, digest = stored_hash.split('$')
+        candidate = hashlib.scrypt(password_input(password, scheme), salt=bytes.fromhex(salt),
+                                   n=int(n), r=int(r), p=int(p))
+        return hmac.compare_digest(candidate.hex(), digest)
+    return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored_hash)
+
+# Verified against for unknown usernames so login takes as long as for real ones
+DUMMY_PASSWORD_HASH = hash_password(secrets.token_hex(16))
+
 def extract_text_for_wordcloud(posts):
     """Extract text from posts for word cloud."""
     combined_text = ""
@@ -173,6 +657,114 @@ def extract_text_for_wordcloud(posts):
             combined_text += post['selftext'] + " "
     return combined_text
 
+def like_contains(term):
+    """LIKE pattern matching term anywhere, with LIKE wildcards in term escaped."""
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+def build_post_filters(args):
+    """Build the numeric, sentiment, subreddit and text filters shared by /posts and /wordcloud."""
+    filters = []
+    params = []
+
+    # Numeric filters
+    if args.get('min_score'):
+        filters.append("score >= ?")
+        params.append(int(args['min_score']))
+    if args.get('max_score'):
+        filters.append("score <= ?")
+        params.append(int(args['max_score']))
+    if args.get('min_comments'):
+        filters.append("num_comments >= ?")
+        params.append(int(args['min_comments']))
+    if args.get('max_comments'):
+        filters.append("num_comments <= ?")
+        params.append(int(args['max_comments']))
+
+    # Sentiment filter
+    sentiment = args.get('sentiment')
+    if sentiment:
+        s = sentiment.lower()
+        # Compare on the integer column; the thresholds are exact at this scale
+        threshold = round(SENTIMENT_THRESHOLD * SENTIMENT_SCALE)
+        if s == 'positive':
+            filters.append("sentiment_q > ?")
+            params.append(threshold)
+        elif s == 'negative':
+            filters.append("sentiment_q < ?")
+            params.append(-threshold)
+        elif s == 'neutral':
+            filters.append("sentiment_q BETWEEN ? AND ?")
+            params.extend([-threshold, threshold])
+
+    # Subreddit filter
+    if args.get('subreddit'):
+        sr = args['subreddit'].lower()
+        filters.append("subreddit LIKE ? ESCAPE '\\'")
+        params.append(like_contains(sr))
+
+    # Text search: every whitespace-separated term must appear in the title or selftext
+    search_term = args.get('search')
+    if search_term:
+        for term in search_term.split():
+            wildcard = like_contains(term)
+            filters.append("(title LIKE ? ESCAPE '\\' OR selftext LIKE ? ESCAPE '\\')")
+            params.extend([wildcard, wildcard])
+
+    return filters, params
+
+def fetch_live_search(q, limit, sort, time_filter, subreddit):
+    """Run a live Reddit search and score each submission. Runs on search_executor."""
+    results = []
+    sr = reddit.subreddit(subreddit)
+    
+    listing = LISTING_SORTS.get(sort)
+    if listing is not None:
+        submissions = listing(sr, limit, time_filter)
+    else:  # default to search
+        submissions = sr.search(q, limit=limit, sort=sort, time_filter=time_filter)
+    
+    # Compiled once so each submission is matched in C without lowercased copies
+    q_pattern = re.compile(re.escape(q), re.IGNORECASE)
+    filter_listing = listing is not None
+    
+    matched = []
+    for submission in submissions:
+        # Skip if search term not in title/selftext for hot/new/top
+        if filter_listing and not q_pattern.search(submission.title) and \
+           not q_pattern.search(submission.selftext or ''):
+            continue
+        matched.append(submission)
+            
+    # Analyze sentiment of each matching submission's title and selftext
+    texts = [f"{submission.title} {submission.selftext}" if submission.selftext else submission.title
+             for submission in matched]
+    sentiments = [analyze_sentiment(text) for text in texts]
+        
+    for submission, sent in zip(matched, sentiments):
+        # Create post data dictionary
+        post_data = {
+            'id': submission.id,
+            'title': submission.title,
+            'subreddit': submission.subreddit.display_name,
+            'score': submission.score,
+            'num_comments': submission.num_comments,
+            'upvote_ratio': submission.upvote_ratio,
+            'url': submission.url,
+            'created_utc': submission.created_utc,
+            'selftext': submission.selftext,
+            'sentiment_compound': sent['compound'],
+            'sentiment_pos': sent['pos'],
+            'sentiment_neu': sent['neu'],
+            'sentiment_neg': sent['neg'],
+            'created_date': datetime.fromtimestamp(submission.created_utc).isoformat(),
+            'author': str(submission.author)
+        }
+        
+        results.append(post_data)
+    
+    return results
+
 # Routes
 @app.route('/', methods=['GET'])
 def home():
@@ -204,52 +796,22 @@ def search_reddit():
     time_filter = request.args.get('time_filter', 'all')  # hour, day, week, month, year, all
     subreddit = request.args.get('subreddit', 'all')  # specific subreddit or 'all'
     
+    # Check cache; a tuple key keeps user-supplied values containing ':' from colliding
+    cache_key = ('search', q, sort, time_filter, subreddit, limit)
+    cached_response = check_cache(cache_key, SEARCH_CACHE_TIMEOUT)
+    if cached_response:
+        return cached_response
+    
     try:
-        results = []
-        sr = reddit.subreddit(subreddit)
-        
-        if sort == 'hot':
-            submissions = sr.hot(limit=limit)
-        elif sort == 'new':
-            submissions = sr.new(limit=limit)
-        elif sort == 'top':
-            submissions = sr.top(limit=limit, time_filter=time_filter)
-        else:  # default to search
-            submissions = sr.search(q, limit=limit, sort=sort, time_filter=time_filter)
+        future = search_executor.submit(fetch_live_search, q, limit, sort, time_filter, subreddit)
+        results = future.result(timeout=SEARCH_TIMEOUT)
         
-        for submission in submissions:
-            # Skip if search term not in title/selftext for hot/new/top
-            if sort in ['hot', 'new', 'top'] and q.lower() not in submission.title.lower() and \
-               (not submission.selftext or q.lower() not in submission.selftext.lower()):
-                continue
-                
-            # Analyze sentiment
-            text = submission.title + " " + (submission.selftext or "")
-            sent = analyze_sentiment(text)
-            
-            # Create post data dictionary
-            post_data = {
-                'id': submission.id,
-                'title': submission.title,
-                'subreddit': submission.subreddit.display_name,
-                'score': submission.score,
-                'num_comments': submission.num_comments,
-                'upvote_ratio': submission.upvote_ratio,
-                'url': submission.url,
-                'created_utc': submission.created_utc,
-                'selftext': submission.selftext,
-                'sentiment_compound': sent['compound'],
-                'sentiment_pos': sent['pos'],
-                'sentiment_neu': sent['neu'],
-                'sentiment_neg': sent['neg'],
-                'created_date': datetime.fromtimestamp(submission.created_utc).isoformat(),
-                'author': str(submission.author)
-            }
-            
-            results.append(post_data)
-            
-        return jsonify(results)
+        response = jsonify(results)
+        return set_cache(cache_key, response)
         
+    except FutureTimeoutError:
+        logger.error(f"Live search timed out after {SEARCH_TIMEOUT}s for {cache_key}")
+        return jsonify({'error': 'Search timed out'}), 504
     except Exception as e:
         logger.error(f"Error in live search: {e}")
         return jsonify({'error': f'Search failed: {str(e)}'}), 500
@@ -271,53 +833,13 @@ def get_posts():
         return search_reddit()
     
     # Regular database search
-    conn = get_db_connection()
+    conn = get_read_db()
     if conn is None:
         return jsonify({"error": "Failed to connect to database"}), 500
 
-    query = "SELECT * FROM posts"
-    filters = []
-    params = []
-
-    # Numeric filters
-    if request.args.get('min_score'):
-        filters.append("score >= ?")
-        params.append(int(request.args['min_score']))
-    if request.args.get('max_score'):
-        filters.append("score <= ?")
-        params.append(int(request.args['max_score']))
-    if request.args.get('min_comments'):
-        filters.append("num_comments >= ?")
-        params.append(int(request.args['min_comments']))
-    if request.args.get('max_comments'):
-        filters.append("num_comments <= ?")
-        params.append(int(request.args['max_comments']))
-
-    # Sentiment filter
-    sentiment = request.args.get('sentiment')
-    if sentiment:
-        s = sentiment.lower()
-        if s == 'positive':
-            filters.append("sentiment_compound > ?")
-            params.append(0.05)
-        elif s == 'negative':
-            filters.append("sentiment_compound < ?")
-            params.append(-0.05)
-        elif s == 'neutral':
-            filters.append("sentiment_compound BETWEEN ? AND ?")
-            params.extend([-0.05, 0.05])
-
-    # Subreddit filter
-    if request.args.get('subreddit'):
-        sr = request.args['subreddit'].lower()
-        filters.append("subreddit LIKE ?")
-        params.append(f"%{sr}%")
-
-    # Text search
-    if search_term:
-        wildcard = f"%{search_term}%"
-        filters.append("(title LIKE ? OR selftext LIKE ?)")
-        params.extend([wildcard, wildcard])
+    # created_date is formatted by SQLite so rows need no per-row Python post-processing
+    query = f"SELECT {POST_COLUMNS}, strftime('%Y-%m-%dT%H:%M:%S', created_utc, 'unixepoch', 'localtime') AS created_date FROM posts"
+    filters, params = build_post_filters(request.args)
 
     # Combine filters
     if filters:
@@ -325,13 +847,16 @@ def get_posts():
 
     # Sorting
     sort_by = request.args.get('sort_by', 'created_utc')
-    valid = ['id','title','score','num_comments','upvote_ratio','url','author','created_utc','sentiment_compound']
-    if sort_by not in valid:
+    if sort_by not in SORTABLE_COLUMNS:
         sort_by = 'created_utc'
     order = request.args.get('order','desc').upper()
     if order not in ['ASC','DESC']:
         order = 'DESC'
     query += f" ORDER BY {sort_by} {order}"
+    if sort_by not in ('created_utc', 'id'):
+        # Tie-break on time so equal sort values page in a stable order; the (column, created_utc)
+        # composites serve the whole ORDER BY for score, num_comments and sentiment_compound
+        query += f", created_utc {order}"
 
     # Pagination
     if request.args.get('limit'):
@@ -351,21 +876,66 @@ def get_posts():
 
     try:
         cur = conn.cursor()
+        cur.row_factory = None  # plain tuples; rows_as_dicts names the columns
         cur.execute(query, tuple(params))
-        rows = cur.fetchall()
+        posts_list = rows_as_dicts(cur)
     except Error as e:
         logger.error(f"Database query error: {e}")
-        conn.close()
         return jsonify({"error": str(e)}), 500
 
-    conn.close()
-    posts_list = [dict(r) for r in rows]
-    for post in posts_list:
-        post['created_date'] = datetime.fromtimestamp(post['created_utc']).isoformat()
-
     response = jsonify(posts_list)
     return set_cache(cache_key, response)
 
+def fetch_live_comments(post_id):
+    """Fetch and score a post's top comments from Reddit, queuing them for storage. Runs on search_executor."""
+    submission = reddit.submission(id=post_id)
+
+    # Replace more comments with their actual content (limited to avoid API rate limiting)
+    submission.comments.replace_more(limit=0)
+
+    comments = []
+    rows = []
+    # Top 10 top-level comments; replace_more(limit=0) has already removed MoreComments stubs
+    top_level = list(islice(submission.comments, 10))
+
+    sentiments = [analyze_sentiment(comment.body) for comment in top_level]
+
+    for comment, sentiment in zip(top_level, sentiments):
+        # Create comment data
+        comment_data = {
+            'id': comment.id,
+            'post_id': post_id,
+            'author': str(comment.author),
+            'body': comment.body,
+            'score': comment.score,
+            'created_utc': comment.created_utc,
+            'sentiment_neg': sentiment['neg'],
+            'sentiment_neu': sentiment['neu'],
+            'sentiment_pos': sentiment['pos'],
+            'sentiment_compound': sentiment['compound']
+        }
+
+        rows.append((
+            comment_data['id'],
+            comment_data['post_id'],
+            comment_data['author'],
+            comment_data['body'],
+            comment_data['score'],
+            comment_data['created_utc'],
+            comment_data['sentiment_neg'],
+            comment_data['sentiment_neu'],
+            comment_data['sentiment_pos'],
+            comment_data['sentiment_compound']
+        ))
+
+        # Add to results
+        comments.append(comment_data)
+
+    # Queue all rows at once so future requests are served from the database
+    if rows:
+        enqueue_writes(INSERT_COMMENT_SQL, rows)
+    return comments
+
 @app.route('/posts/<string:post_id>/comments', methods=['GET'])
 def get_comments(post_id):
     """Get comments for a specific post."""
@@ -375,94 +945,42 @@ def get_comments(post_id):
     if cached_response:
         return cached_response
     
-    conn = get_db_connection()
+    conn = get_read_db()
     if conn is None:
         return jsonify({"error": "Failed to connect to database"}), 500
         
     try:
         # First check if the post exists
         cur = conn.cursor()
-        cur.execute('SELECT * FROM posts WHERE id = ?', (post_id,))
+        cur.execute('SELECT 1 FROM posts WHERE id = ?', (post_id,))
         post = cur.fetchone()
         
         if not post:
             return jsonify({"error": f"Post with ID {post_id} not found"}), 404
             
         # Fetch comments
+        cur.row_factory = None  # plain tuples; rows_as_dicts names the columns
         cur.execute(
             'SELECT * FROM comments WHERE post_id = ? ORDER BY score DESC', 
             (post_id,)
         )
-        comments = [dict(row) for row in cur.fetchall()]
+        comments = rows_as_dicts(cur)
         
         # If no comments in database but reddit API is available, try to fetch them
         if not comments and reddit is not None:
             try:
-                # Try to fetch comments from Reddit API
-                submission = reddit.submission(id=post_id)
-                
-                # Replace more comments with their actual content (limited to avoid API rate limiting)
-                submission.comments.replace_more(limit=0)
-                
-                comments = []
-                # Get top-level comments
-                for comment in list(submission.comments)[:10]:  # Limit to top 10
-                    if not hasattr(comment, 'body'):  # Skip non-comment objects
-                        continue
-                        
-                    # Analyze sentiment
-                    sentiment = analyze_sentiment(comment.body)
-                    
-                    # Create comment data
-                    comment_data = {
-                        'id': comment.id,
-                        'post_id': post_id,
-                        'author': str(comment.author),
-                        'body': comment.body,
-                        'score': comment.score,
-                        'created_utc': comment.created_utc,
-                        'sentiment_neg': sentiment['neg'],
-                        'sentiment_neu': sentiment['neu'],
-                        'sentiment_pos': sentiment['pos'],
-                        'sentiment_compound': sentiment['compound']
-                    }
-                    
-                    # Insert into database for future requests
-                    try:
-                        sql = '''
-                            INSERT OR REPLACE INTO comments(
-                                id, post_id, author, body, score, created_utc,
-                                sentiment_neg, sentiment_neu, sentiment_pos, sentiment_compound
-                            )
-                            VALUES(?,?,?,?,?,?,?,?,?,?)
-                        '''
-                        cur.execute(sql, (
-                            comment_data['id'],
-                            comment_data['post_id'],
-                            comment_data['author'],
-                            comment_data['body'],
-                            comment_data['score'],
-                            comment_data['created_utc'],
-                            comment_data['sentiment_neg'],
-                            comment_data['sentiment_neu'],
-                            comment_data['sentiment_pos'],
-                            comment_data['sentiment_compound']
-                        ))
-                        conn.commit()
-                    except Exception as e:
-                        logger.error(f"Error inserting comment {comment_data['id']}: {e}")
-                    
-                    # Add to results
-                    comments.append(comment_data)
+                future = search_executor.submit(fetch_live_comments, post_id)
+                comments = future.result(timeout=SEARCH_TIMEOUT)
+            except FutureTimeoutError:
+                logger.error(f"Comment fetch timed out after {SEARCH_TIMEOUT}s for post {post_id}")
+                return jsonify({'error': 'Comment fetch timed out'}), 504
             except Exception as e:
                 logger.error(f"Error fetching comments from Reddit API: {e}")
                 # Continue with empty comments list
         
-        conn.close()
         response = jsonify(comments)
         return set_cache(cache_key, response)
     except Exception as e:
-        conn.close()
         logger.error(f"Error retrieving comments: {e}")
         return jsonify({"error": str(e)}), 500
 
@@ -475,29 +993,27 @@ def get_popular_subreddits():
     if cached_response:
         return cached_response
     
-    conn = get_db_connection()
+    conn = get_read_db()
     if conn is None:
         return jsonify({"error": "Failed to connect to database"}), 500
         
     try:
         cur = conn.cursor()
+        # Served from the rollup table, which is maintained by triggers on posts
         cur.execute('''
-            SELECT subreddit, COUNT(*) as count 
-            FROM posts 
-            WHERE subreddit IS NOT NULL AND subreddit != ''
-            GROUP BY subreddit 
-            ORDER BY count DESC 
+            SELECT subreddit, SUM(cnt) as count
+            FROM posts_rollup
+            WHERE subreddit != ''
+            GROUP BY subreddit
+            ORDER BY count DESC, subreddit
             LIMIT 20
         ''')
         
         subreddits = [{"name": row[0], "count": row[1]} for row in cur.fetchall()]
-        conn.close()
         
         response = jsonify(subreddits)
         return set_cache(cache_key, response)
     except Exception as e:
-        if conn:
-            conn.close()
         logger.error(f"Error fetching popular subreddits: {e}")
         return jsonify({"error": str(e)}), 500
 
@@ -511,56 +1027,14 @@ def get_wordcloud_data():
     if cached_response:
         return cached_response
     
-    conn = get_db_connection()
+    conn = get_read_db()
     if conn is None:
         return jsonify({"error": "Failed to connect to database"}), 500
 
     # Build query similar to get_posts but we only need title and selftext
     query = "SELECT title, selftext FROM posts"
-    filters = []
-    params = []
-
     # Reuse filters from get_posts
-    # Numeric filters
-    if request.args.get('min_score'):
-        filters.append("score >= ?")
-        params.append(int(request.args['min_score']))
-    if request.args.get('max_score'):
-        filters.append("score <= ?")
-        params.append(int(request.args['max_score']))
-    if request.args.get('min_comments'):
-        filters.append("num_comments >= ?")
-        params.append(int(request.args['min_comments']))
-    if request.args.get('max_comments'):
-        filters.append("num_comments <= ?")
-        params.append(int(request.args['max_comments']))
-
-    # Sentiment filter
-    sentiment = request.args.get('sentiment')
-    if sentiment:
-        s = sentiment.lower()
-        if s == 'positive':
-            filters.append("sentiment_compound > ?")
-            params.append(0.05)
-        elif s == 'negative':
-            filters.append("sentiment_compound < ?")
-            params.append(-0.05)
-        elif s == 'neutral':
-            filters.append("sentiment_compound BETWEEN ? AND ?")
-            params.extend([-0.05, 0.05])
-
-    # Subreddit filter
-    if request.args.get('subreddit'):
-        sr = request.args['subreddit'].lower()
-        filters.append("subreddit LIKE ?")
-        params.append(f"%{sr}%")
-
-    # Text search
-    search_term = request.args.get('search')
-    if search_term:
-        wildcard = f"%{search_term}%"
-        filters.append("(title LIKE ? OR selftext LIKE ?)")
-        params.extend([wildcard, wildcard])
+    filters, params = build_post_filters(request.args)
 
     # Combine filters
     if filters:
@@ -578,7 +1052,6 @@ def get_wordcloud_data():
         all_text = " ".join([f"{post['title']} {post['selftext']}" for post in posts])
         
         # Clean text
-        import re
         from collections import Counter
         
         # Convert to lowercase and remove punctuation
@@ -610,13 +1083,9 @@ def get_wordcloud_data():
         # Format for word cloud
         word_cloud_data = [{"text": word, "value": count} for word, count in top_words]
         
-        conn.close()
-        
         response = jsonify(word_cloud_data)
         return set_cache(cache_key, response)
     except Exception as e:
-        if conn:
-            conn.close()
         logger.error(f"Error generating word cloud data: {e}")
         return jsonify({"error": str(e)}), 500
 
@@ -631,27 +1100,21 @@ def register():
     username = data.get('username')
     password = data.get('password')
     
-    # Simple password hash
-    password_hash = hashlib.sha256(password.encode()).hexdigest()
+    password_hash = hash_password(password)
     
-    conn = get_db_connection()
+    conn = get_db()
     if conn is None:
         return jsonify({"error": "Database connection failed"}), 500
     
     try:
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
-        if cursor.fetchone():
-            conn.close()
-            return jsonify({'message': 'Username already exists'}), 409
-        
+        # The UNIQUE username index does the duplicate check; no row inserted means it was taken
         cursor.execute(
-            'INSERT INTO users (username, password_hash) VALUES (?, ?)',
+            'INSERT INTO users (username, password_hash) VALUES (?, ?) ON CONFLICT(username) DO NOTHING',
             (username, password_hash)
         )
-        
-        conn.commit()
-        conn.close()
+        if cursor.rowcount == 0:
+            return jsonify({'message': 'Username already exists'}), 409
         
         return jsonify({
             'message': 'User registered successfully',
@@ -659,8 +1122,6 @@ def register():
         }), 201
         
     except Exception as e:
-        if conn:
-            conn.close()
         logger.error(f"Registration error: {e}")
         return jsonify({'message': f'Registration failed: {str(e)}'}), 500
 
@@ -674,22 +1135,31 @@ def login():
     username = data.get('username')
     password = data.get('password')
     
-    password_hash = hashlib.sha256(password.encode()).hexdigest()
-    
-    conn = get_db_connection()
+    conn = get_db()
     if conn is None:
         return jsonify({"error": "Database connection failed"}), 500
         
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM users WHERE username = ? AND password_hash = ?', 
-                 (username, password_hash))
+    # username is UNIQUE, so this is a single lookup on its index
+    cursor.execute('SELECT id, password_hash FROM users WHERE username = ?', (username,))
     user = cursor.fetchone()
     
-    if not user:
-        conn.close()
+    if user is None:
+        verify_password(DUMMY_PASSWORD_HASH, password)
         return jsonify({'message': 'Invalid username or password'}), 401
+    try:
+        valid = verify_password(user['password_hash'], password)
+    except ValueError as e:
+        logger.error(f"Cannot verify password for {username}: {e}")
+        return jsonify({'message': 'Login failed: server password configuration error'}), 500
+    if not valid:
+        return jsonify({'message': 'Invalid username or password'}), 401
+
+    # Upgrade legacy or unpeppered hashes now that we have the plaintext
+    if not user['password_hash'].startswith(f"{PASSWORD_SCHEME}$"):
+        cursor.execute('UPDATE users SET password_hash = ? WHERE id = ?',
+                       (hash_password(password), user['id']))
         
-    conn.close()
     
     return jsonify({
         'message': 'Login successful',
@@ -718,4 +1188,5 @@ if __name__ == '__main__':
     port = int(os.environ.get('FLASK_PORT', 5000))
     
     logger.info(f"Starting Flask server on port {port}, debug mode: {debug_mode}")
-    app.run(debug=debug_mode, host='0.0.0.0', port=port)
\ No newline at end of file
+    # The dev server is for local use only; deploy with gunicorn via wsgi.py
+    app.run(debug=debug_mode, host='0.0.0.0', port=port, threaded=True)
\ No newline at end of file
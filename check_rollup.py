@@ -0,0 +1,105 @@
+"""Randomized check that the posts_rollup triggers match a full recount.
+
+Runs a mix of plain, OR REPLACE, OR IGNORE, upsert, multi-row, update and delete writes against a
+scratch database, the way an external collector would, and compares posts_rollup with a recount
+from posts after every write. Run from the repository root: python check_rollup.py [ops] [seed]
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SUBREDDITS = ['europe', 'ireland', 'worldnews']
+COLUMNS = 'id, subreddit, created_utc, score, num_comments, sentiment_compound'
+
+
+def random_post(rng, ids):
+    """A posts row for one of a small pool of ids so writes keep colliding."""
+    return (
+        rng.choice(ids),
+        rng.choice(SUBREDDITS + [None]),
+        rng.choice([None, 86400.0 * rng.randint(0, 3) + rng.random()]),
+        rng.choice([None, rng.randint(-5, 50)]),
+        rng.choice([None, rng.randint(0, 20)]),
+        rng.choice([None, 0.0, 0.05, -0.05, round(rng.uniform(-1, 1), 4)]),
+    )
+
+
+def recount(conn, threshold):
+    """posts_rollup as a full GROUP BY over posts would build it."""
+    return sorted(conn.execute(f'''
+        SELECT CAST(created_utc / 86400 AS INTEGER) AS day, subreddit,
+               SUM(IFNULL(sentiment_compound > {threshold}, 0)),
+               SUM(IFNULL(sentiment_compound BETWEEN -{threshold} AND {threshold}, 0)),
+               SUM(IFNULL(sentiment_compound < -{threshold}, 0)),
+               SUM(IFNULL(score, 0)), SUM(IFNULL(num_comments, 0)), COUNT(*)
+        FROM posts
+        WHERE subreddit IS NOT NULL AND created_utc IS NOT NULL
+        GROUP BY day, subreddit
+    '''))
+
+
+def random_write(conn, rng, ids):
+    """Apply one random write and return a short description of it."""
+    kind = rng.choice(['insert', 'replace', 'ignore', 'upsert', 'multi', 'update', 'delete'])
+    row = random_post(rng, ids)
+    placeholders = ', '.join('?' * len(row))
+    if kind in ('insert', 'replace', 'ignore'):
+        verb = {'insert': 'INSERT', 'replace': 'INSERT OR REPLACE', 'ignore': 'INSERT OR IGNORE'}[kind]
+        try:
+            conn.execute(f'{verb} INTO posts ({COLUMNS}) VALUES ({placeholders})', row)
+        except sqlite3.IntegrityError:
+            pass
+    elif kind == 'upsert':
+        conn.execute(f'''
+            INSERT INTO posts ({COLUMNS}) VALUES ({placeholders})
+            ON CONFLICT(id) DO UPDATE SET score = excluded.score, sentiment_compound = excluded.sentiment_compound
+        ''', row)
+    elif kind == 'multi':
+        conn.execute(f'CREATE TEMP TABLE staged AS SELECT {COLUMNS} FROM posts WHERE 0')
+        conn.executemany(f'INSERT INTO staged VALUES ({placeholders})',
+                         [random_post(rng, ids) for _ in range(rng.randint(1, 5))])
+        verb = rng.choice(['INSERT OR REPLACE', 'INSERT OR IGNORE'])
+        conn.execute(f'{verb} INTO posts ({COLUMNS}) SELECT {COLUMNS} FROM staged')
+        conn.execute('DROP TABLE staged')
+    elif kind == 'update':
+        conn.execute('UPDATE posts SET subreddit = ?, created_utc = ?, score = ?, num_comments = ? WHERE id = ?',
+                     row[1:5] + row[:1])
+    else:
+        conn.execute('DELETE FROM posts WHERE id = ?', row[:1])
+    return kind
+
+
+def main(ops=3000, seed=0):
+    os.chdir(tempfile.mkdtemp())
+    sys.path.insert(0, ROOT)
+    import app  # init_db() creates the schema and triggers in the working directory
+
+    rng = random.Random(seed)
+    ids = [f'p{i}' for i in range(40)]
+    for recursive in (False, True):
+        conn = sqlite3.connect(app.DATABASE, isolation_level=None)
+        conn.execute('DELETE FROM posts')
+        conn.execute(f'PRAGMA recursive_triggers = {int(recursive)}')
+        for step in range(ops):
+            kind = random_write(conn, rng, ids)
+            rollup = sorted(conn.execute('SELECT day, subreddit, pos, neu, neg, sum_score, sum_comments, cnt '
+                                         'FROM posts_rollup'))
+            expected = recount(conn, app.SENTIMENT_THRESHOLD)
+            if rollup != expected:
+                sys.exit(f'recursive_triggers={recursive}: rollup diverged after {kind} (step {step})\n'
+                         f'rollup:   {rollup}\nexpected: {expected}')
+        # A completed insert clears whatever ignored inserts and upserts left stashed
+        conn.execute(f'INSERT OR REPLACE INTO posts ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)',
+                     random_post(rng, ids))
+        stashed = conn.execute('SELECT COUNT(*) FROM posts_rollup_replaced').fetchone()[0]
+        if stashed:
+            sys.exit(f'recursive_triggers={recursive}: {stashed} rows left in posts_rollup_replaced')
+        conn.close()
+        print(f'recursive_triggers={recursive}: {ops} writes, rollup matches recount')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
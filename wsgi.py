@@ -0,0 +1,12 @@
+"""WSGI entry point for running the API under gunicorn with gevent workers.
+
+    gunicorn -k gevent -w 4 --worker-connections 1000 -b 0.0.0.0:5000 wsgi:app
+
+The standard library is patched before app is imported so PRAW's HTTP calls
+yield to other greenlets instead of blocking the worker. SQLite calls still
+block natively while they run, so keep queries short.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+from app import app  # noqa: E402